@@ -1,7 +1,18 @@
 import os
+import sys
+import json
+import asyncio
 import time
+import threading
+import re
+import bisect
+import textwrap
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
 import tweepy
+from tweepy.asynchronous import AsyncClient, AsyncPaginator, AsyncStreamingClient
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
@@ -28,7 +39,11 @@ class Config:
     BOT_USERNAME = "projectruggaurd"
     TRIGGER_PHRASE = "riddle me this"
     TRUSTED_LIST_URL = "https://raw.githubusercontent.com/devsyrem/turst-list/main/list"
+    TRUSTED_LIST_TIMEOUT = (3, 10)  # (connect, read) timeouts in seconds
     MIN_TRUSTED_FOLLOWERS = 2
+    # One page of followers per analysis. The followers endpoint allows 15 requests
+    # per 15 minutes, and with wait_on_rate_limit a longer scan would stall the stream.
+    MAX_FOLLOWERS_SCANNED = 1000
 
 config = Config()
 
@@ -37,101 +52,286 @@ config = Config()
 # 2. TRUSTED LIST HANDLER
 # ==============================================================================
 
-# Simple cache to avoid repeatedly hitting the GitHub URL
+# Cache to avoid repeatedly hitting the GitHub URL. The list is also persisted
+# to disk with its ETag/Last-Modified so restarts and refreshes can use a
+# conditional GET and only download the file when it has actually changed.
+# A background thread keeps it fresh, so the stream never waits on GitHub.
 _trusted_accounts_cache = None
-_cache_timestamp = 0
-CACHE_DURATION_SECONDS = 3600  # Cache for 1 hour
+_trusted_accounts_lock = threading.Lock()
+_trusted_user_ids_cache = None  # {casefolded username: id}, built from _trusted_accounts_cache
+_trusted_user_ids_source = None
+_cache_etag = None
+_cache_last_modified = None
+CACHE_DURATION_SECONDS = 24 * 3600  # Refresh every 24 hours
+REFRESH_RETRY_MIN_SECONDS = 60  # First retry delay after a failed refresh
+CACHE_FILE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "rugguard", "trusted.json")
+
+# Shared HTTP session so the connection to GitHub is kept alive between refreshes
+_HTTP = requests.Session()
+_HTTP.headers.update({"User-Agent": "rugguard/1.0"})
+_HTTP.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+def load_trusted_accounts_from_disk():
+    """
+    Loads the trusted list and its validators from the on-disk cache, if present.
+    """
+    global _trusted_accounts_cache, _cache_etag, _cache_last_modified
 
-def get_trusted_accounts():
+    try:
+        with open(CACHE_FILE_PATH, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable trusted list cache: {e}")
+        return
+
+    accounts = frozenset(sys.intern(account.casefold()) for account in cached.get("accounts", []))
+    with _trusted_accounts_lock:
+        _trusted_accounts_cache = accounts
+    _cache_etag = cached.get("etag")
+    _cache_last_modified = cached.get("last_modified")
+    print(f"Loaded {len(accounts)} trusted accounts from disk cache.")
+
+def save_trusted_accounts_to_disk(accounts, etag, last_modified):
+    """
+    Writes the trusted list and its validators to the on-disk cache atomically.
+    """
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE_PATH), exist_ok=True)
+        tmp_path = CACHE_FILE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "accounts": sorted(accounts)}, f)
+        os.replace(tmp_path, CACHE_FILE_PATH)
+    except OSError as e:
+        print(f"Failed to write trusted list cache: {e}")
+
+def refresh_trusted_accounts():
     """
-    Fetches the list of trusted accounts from GitHub.
-    Uses a cache for efficiency.
+    Fetches the list of trusted accounts from GitHub into the cache.
+    Revalidates the cached copy with a conditional GET when possible.
     """
-    global _trusted_accounts_cache, _cache_timestamp
+    global _trusted_accounts_cache, _cache_etag, _cache_last_modified
 
-    current_time = time.time()
-    if _trusted_accounts_cache and (current_time - _cache_timestamp < CACHE_DURATION_SECONDS):
-        print("Using trusted list from cache.")
-        return _trusted_accounts_cache
+    headers = {}
+    if _trusted_accounts_cache:
+        if _cache_etag:
+            headers["If-None-Match"] = _cache_etag
+        if _cache_last_modified:
+            headers["If-Modified-Since"] = _cache_last_modified
 
     print("Fetching new trusted list from GitHub...")
-    try:
-        response = requests.get(config.TRUSTED_LIST_URL)
+    with _HTTP.get(config.TRUSTED_LIST_URL, headers=headers, stream=True,
+                   timeout=config.TRUSTED_LIST_TIMEOUT) as response:
+        if response.status_code == 304:
+            print("Trusted list unchanged on GitHub, keeping cached copy.")
+            return
         response.raise_for_status()  # Check for HTTP errors
-        
-        # Clean and format the list
-        accounts = {line.strip().lower() for line in response.text.splitlines() if line.strip()}
-        
+        response.encoding = response.encoding or "utf-8"  # iter_lines yields bytes otherwise
+
+        # Clean and format the list line by line, without holding the whole body.
+        # The list is read-only once fetched, so store it as a frozenset of interned names.
+        accounts = frozenset(
+            sys.intern(line.strip().casefold())
+            for line in response.iter_lines(decode_unicode=True) if line.strip()
+        )
+
+        _cache_etag = response.headers.get("ETag")
+        _cache_last_modified = response.headers.get("Last-Modified")
+
+    with _trusted_accounts_lock:
         _trusted_accounts_cache = accounts
-        _cache_timestamp = current_time
-        print(f"Successfully fetched {len(accounts)} trusted accounts.")
-        return accounts
-    except requests.RequestException as e:
-        print(f"Failed to fetch trusted list: {e}")
-        # If fetching fails, return the old cache if it exists, or an empty set
-        return _trusted_accounts_cache if _trusted_accounts_cache else set()
+    save_trusted_accounts_to_disk(accounts, _cache_etag, _cache_last_modified)
+    print(f"Successfully fetched {len(accounts)} trusted accounts.")
+
+def _refresh_loop():
+    """
+    Refreshes the trusted list every CACHE_DURATION_SECONDS, forever.
+    After a failed fetch it retries sooner, doubling the delay each time.
+    """
+    retry_delay = REFRESH_RETRY_MIN_SECONDS
+    while True:
+        try:
+            refresh_trusted_accounts()
+        except requests.RequestException as e:
+            # Keep serving the old cache and try again soon
+            print(f"Failed to fetch trusted list: {e}")
+        except Exception as e:
+            print(f"Unexpected error while refreshing trusted list: {e}")
+        else:
+            retry_delay = REFRESH_RETRY_MIN_SECONDS
+            time.sleep(CACHE_DURATION_SECONDS)
+            continue
+        print(f"Retrying trusted list fetch in {retry_delay} seconds.")
+        time.sleep(retry_delay)
+        retry_delay = min(retry_delay * 2, CACHE_DURATION_SECONDS)
+
+def start_trusted_accounts_refresher():
+    """Starts the background thread that keeps the trusted list up to date."""
+    thread = threading.Thread(target=_refresh_loop, name="trusted-list-refresher", daemon=True)
+    thread.start()
+    return thread
+
+def get_trusted_accounts():
+    """
+    Returns the cached list of trusted accounts.
+    Never touches the network; the background refresher keeps it current.
+    """
+    return _trusted_accounts_cache if _trusted_accounts_cache else frozenset()
+
+
+async def get_trusted_user_ids(client: AsyncClient, accounts) -> dict:
+    """
+    Resolves the trusted usernames to X user IDs.
+    Looks users up in batches of 100 (the API maximum) and caches the result
+    until the trusted list itself is refreshed. If any batch fails, the partial
+    result is returned but not cached, so the next call tries again.
+    """
+    global _trusted_user_ids_cache, _trusted_user_ids_source
+
+    if _trusted_user_ids_cache is not None and _trusted_user_ids_source is accounts:
+        return _trusted_user_ids_cache
+
+    print("Resolving trusted accounts to user IDs...")
+    usernames = sorted(accounts)
+    user_ids = {}
+    all_batches_resolved = True
+    for i in range(0, len(usernames), 100):
+        chunk = usernames[i:i + 100]
+        try:
+            response = await client.get_users(usernames=chunk)
+        except tweepy.errors.TweepyException as e:
+            print(f"Failed to resolve trusted accounts batch: {e}")
+            all_batches_resolved = False
+            continue
+        for user in response.data or []:
+            user_ids[user.username.casefold()] = user.id
+
+    if all_batches_resolved:
+        _trusted_user_ids_cache = user_ids
+        _trusted_user_ids_source = accounts
+    print(f"Resolved {len(user_ids)} trusted accounts to user IDs.")
+    return user_ids
 
 
 # ==============================================================================
 # 3. ANALYSIS ENGINE
 # ==============================================================================
 
-def analyze_user_account(client: tweepy.Client, user_id: str) -> dict:
+# Short-lived cache of failed lookups (deleted/protected accounts) so repeated
+# triggers for the same user don't spend rate limit on a known failure
+_neg_cache = OrderedDict()  # {user_id: (timestamp, error message)}
+NEG_TTL = 600  # Remember failures for 10 minutes
+NEG_CACHE_MAX_SIZE = 1024
+
+def get_cached_failure(user_id):
+    """
+    Returns the cached error message for a user ID, or None if there is none.
+    Expired entries are evicted along the way.
+    """
+    current_time = time.time()
+    while _neg_cache:
+        oldest_id, (timestamp, _) = next(iter(_neg_cache.items()))
+        if current_time - timestamp < NEG_TTL:
+            break
+        del _neg_cache[oldest_id]
+
+    entry = _neg_cache.get(str(user_id))
+    return entry[1] if entry else None
+
+def remember_failure(user_id, error_msg):
+    """
+    Stores a failed lookup in the negative cache, evicting the oldest entry when full.
+    """
+    key = str(user_id)
+    _neg_cache.pop(key, None)
+    _neg_cache[key] = (time.time(), error_msg)
+    if len(_neg_cache) > NEG_CACHE_MAX_SIZE:
+        _neg_cache.popitem(last=False)
+
+async def analyze_user_account(client: AsyncClient, user_id: str) -> dict:
     """
     Analyzes an X user account and returns a report as a dictionary.
     """
     print(f"Starting analysis for user ID: {user_id}")
     report = {"error": None, "data": {}}
+
+    cached_error = get_cached_failure(user_id)
+    if cached_error:
+        print("Using cached failure for this user.")
+        report["error"] = cached_error
+        return report
     
     try:
         # Get primary user data using expansions to be efficient
-        response = client.get_user(
+        response = await client.get_user(
             id=user_id,
             user_fields=["created_at", "description", "public_metrics", "verified"]
         )
         user = response.data
         if not user:
             report["error"] = "User not found."
+            remember_failure(user_id, report["error"])
             return report
 
         # Extract basic metrics
-        account_age = datetime.now(timezone.utc) - user.created_at
-        follower_count = user.public_metrics.get('followers_count', 0)
-        following_count = user.public_metrics.get('following_count', 0)
-        follower_ratio = follower_count / following_count if following_count > 0 else float(follower_count)
+        now = datetime.now(timezone.utc)
+        created_at = user.created_at
+        account_age = now - created_at
+        public_metrics = user.public_metrics or {}
+        follower_count = public_metrics.get('followers_count', 0)
+        following_count = public_metrics.get('following_count', 0)
+        tweet_count = public_metrics.get('tweet_count', 0)
+        follower_ratio = follower_count / following_count if following_count else float(follower_count)
 
         report["data"] = {
             "username": user.username,
             "name": user.name,
             "id": user.id,
             "account_age_days": account_age.days,
-            "created_at": user.created_at.strftime('%b %Y'),
+            "created_at": created_at.strftime('%b %Y'),
             "is_verified": user.verified,
             "bio": user.description,
             "followers": follower_count,
             "following": following_count,
             "follower_ratio": round(follower_ratio, 2),
-            "tweet_count": user.public_metrics.get('tweet_count', 0),
+            "tweet_count": tweet_count,
         }
 
         # Trusted Follower Cross-Check Analysis
         print("Checking trusted followers...")
         trusted_accounts_on_list = get_trusted_accounts()
-        
-        if user.username.lower() in trusted_accounts_on_list:
+        if sys.intern(user.username.casefold()) in trusted_accounts_on_list:
             report['data']['is_on_trusted_list'] = True
             report['data']['vouched_by_count'] = len(trusted_accounts_on_list) # Max score
         else:
             report['data']['is_on_trusted_list'] = False
-            # Note: This check is limited by the Free X API tier.
-            # A full implementation requires 'Basic' tier access or higher.
-            report['data']['vouched_by_count'] = 0 # Placeholder
-            report['data']['vouched_by_list'] = [] # Placeholder
-            report['data']['trusted_check_note'] = "Follower check requires 'Basic' tier X API access or higher."
+            trusted_user_ids = await get_trusted_user_ids(client, trusted_accounts_on_list)
+            trusted_ids = {uid: name for name, uid in trusted_user_ids.items()}
+            vouched_by = []
+            # Nothing can match without resolved IDs, so don't spend follower requests
+            if trusted_ids:
+                try:
+                    followers = AsyncPaginator(
+                        client.get_users_followers, user.id,
+                        max_results=1000, user_fields=["username"]
+                    ).flatten(limit=config.MAX_FOLLOWERS_SCANNED)
+                    vouched_by = [trusted_ids[follower.id] async for follower in followers if follower.id in trusted_ids]
+                except tweepy.errors.TweepyException as e:
+                    print(f"Could not fetch followers for trusted check: {e}")
+            report['data']['vouched_by_count'] = len(vouched_by)
+            report['data']['vouched_by_list'] = vouched_by
 
     except tweepy.errors.TweepyException as e:
         print(f"Tweepy error during analysis: {e}")
         report["error"] = f"Failed to fetch user data from X. The account might be protected. (Error: {e})"
+        # Rate limits and server errors are transient, don't remember them
+        if not isinstance(e, (tweepy.errors.TooManyRequests, tweepy.errors.TwitterServerError)):
+            remember_failure(user_id, report["error"])
     except Exception as e:
         print(f"Unexpected error during analysis: {e}")
         report["error"] = "An internal error occurred during the analysis process."
@@ -143,6 +343,42 @@ def analyze_user_account(client: tweepy.Client, user_id: str) -> dict:
 # 4. REPLY GENERATOR
 # ==============================================================================
 
+# Trust level by score: the first cutoff strictly greater than the score wins.
+_TRUST_LEVELS = (
+    (40, "Low 🔴"),
+    (65, "Medium 🟠"),
+    (85, "High 🟡"),
+    (101, "Very High 🟢"),
+)
+_TRUST_LEVEL_CUTOFFS = [cutoff for cutoff, _ in _TRUST_LEVELS]
+
+# Scoring signals: (report key, predicate, points, reason shown in the reply or None)
+_SIGNALS = (
+    ("account_age_days", lambda days: days > 365, 25, "✅ Account age > 1 year"),
+    ("followers", lambda followers: followers > 1000, 15, None),
+    ("follower_ratio", lambda ratio: ratio > 2, 20, "✅ Follower/Following ratio > 2"),
+    ("is_verified", bool, 25, "✅ Verified Account"),
+)
+
+# Reply skeleton, dedented once at import
+_REPLY_TEMPLATE = textwrap.dedent("""\
+    🤖 Trustworthiness Analysis for @{username}
+    -----------------------------------
+    📊 Trust Level: {trust_level} ({score}/100)
+
+    📝 Summary:
+    - Account Age: {account_age_days} days (Created {created_at})
+    - Followers: {followers} | Following: {following}
+    - Bio: {bio_status}
+
+    💡 Key Signals:
+    {signals}
+
+    {trusted_check_note}
+    -----------------------------------
+    A bot by #ProjectRUGGUARD""")
+_format_reply = _REPLY_TEMPLATE.format  # Bound once, called with explicit fields per reply
+
 def generate_reply(analysis_report: dict) -> str:
     """
     Creates a clean reply string from the analysis report.
@@ -151,23 +387,16 @@ def generate_reply(analysis_report: dict) -> str:
         return f"🤖 Analysis failed. {analysis_report['error']}"
 
     data = analysis_report["data"]
-    username = data['username']
     
     # Simple Trust Score Logic
     score = 0
     reasons = []
 
-    if data['account_age_days'] > 365:
-        score += 25
-        reasons.append("✅ Account age > 1 year")
-    if data['followers'] > 1000:
-        score += 15
-    if data['follower_ratio'] > 2:
-        score += 20
-        reasons.append("✅ Follower/Following ratio > 2")
-    if data['is_verified']:
-        score += 25
-        reasons.append("✅ Verified Account")
+    for key, predicate, points, reason in _SIGNALS:
+        if predicate(data[key]):
+            score += points
+            if reason:
+                reasons.append(reason)
     if data['is_on_trusted_list']:
         score = 100 # Full score if on the main list
         reasons.append("🚀 RUGGUARD Trusted List Member!")
@@ -178,42 +407,31 @@ def generate_reply(analysis_report: dict) -> str:
     score = min(score, 100) # Cap score at 100
 
     # Determine trust level
-    if score >= 85:
-        trust_level = "Very High 🟢"
-    elif score >= 65:
-        trust_level = "High 🟡"
-    elif score >= 40:
-        trust_level = "Medium 🟠"
-    else:
-        trust_level = "Low 🔴"
+    trust_level = _TRUST_LEVELS[bisect.bisect_right(_TRUST_LEVEL_CUTOFFS, score)][1]
 
     # Build the Reply Text
-    reply_text = f"""
-    🤖 Trustworthiness Analysis for @{username}
-    -----------------------------------
-    📊 Trust Level: {trust_level} ({score}/100)
-
-    📝 Summary:
-    - Account Age: {data['account_age_days']} days (Created {data['created_at']})
-    - Followers: {data['followers']} | Following: {data['following']}
-    - Bio: {'Present' if data['bio'] else 'Empty'}
-
-    💡 Key Signals:
-    {' | '.join(reasons) if reasons else 'No strong signals detected.'}
-    
-    {data.get('trusted_check_note', '')}
-    -----------------------------------
-    A bot by #ProjectRUGGUARD
-    """
-    # Clean up extra whitespace from the multiline string
-    return "\n".join(line.strip() for line in reply_text.strip().split('\n'))
+    return _format_reply(
+        username=data['username'],
+        trust_level=trust_level,
+        score=score,
+        account_age_days=data['account_age_days'],
+        created_at=data['created_at'],
+        followers=data['followers'],
+        following=data['following'],
+        bio_status='Present' if data['bio'] else 'Empty',
+        signals=' | '.join(reasons) if reasons else 'No strong signals detected.',
+        trusted_check_note=data.get('trusted_check_note', ''),
+    )
 
 
 # ==============================================================================
 # 5. BOT STREAM LISTENER
 # ==============================================================================
 
-class BotStreamListener(tweepy.StreamingClient):
+# Compiled once so matching doesn't lowercase a copy of every incoming tweet
+_TRIGGER_RE = re.compile(re.escape(config.TRIGGER_PHRASE), re.IGNORECASE)
+
+class BotStreamListener(AsyncStreamingClient):
     """
     A listener that monitors the tweet stream for the trigger phrase.
     """
@@ -222,18 +440,18 @@ class BotStreamListener(tweepy.StreamingClient):
         self.client_v2 = client_v2 # Client for performing actions (get_user, reply)
         print("Bot Listener is ready and listening...")
 
-    def on_tweet(self, tweet: tweepy.Tweet):
+    async def on_tweet(self, tweet: tweepy.Tweet):
         """Called every time a new tweet matches the filter rules."""
         print(f"Detected tweet from @{tweet.author_id}: {tweet.text}")
 
         is_reply = tweet.referenced_tweets and tweet.referenced_tweets[0].type == 'replied_to'
-        contains_trigger = config.TRIGGER_PHRASE.lower() in tweet.text.lower()
+        contains_trigger = _TRIGGER_RE.search(tweet.text) is not None
 
         if is_reply and contains_trigger:
             print(">>> Trigger Detected! <<<")
             original_tweet_id = tweet.referenced_tweets[0].id
             try:
-                original_tweet_response = self.client_v2.get_tweet(original_tweet_id, expansions=["author_id"])
+                original_tweet_response = await self.client_v2.get_tweet(original_tweet_id, expansions=["author_id"])
                 original_tweet = original_tweet_response.data
                 
                 if not original_tweet or not original_tweet.author_id:
@@ -243,13 +461,13 @@ class BotStreamListener(tweepy.StreamingClient):
                 target_user_id = original_tweet.author_id
                 
                 # Start the analysis
-                analysis_result = analyze_user_account(self.client_v2, target_user_id)
+                analysis_result = await analyze_user_account(self.client_v2, target_user_id)
 
                 # Generate and send the reply
                 reply_text = generate_reply(analysis_result)
                 
                 print(f"Sending reply to tweet ID: {tweet.id}")
-                self.client_v2.create_tweet(text=reply_text, in_reply_to_tweet_id=tweet.id)
+                await self.client_v2.create_tweet(text=reply_text, in_reply_to_tweet_id=tweet.id)
                 print(">>> Reply successfully sent! <<<")
 
             except tweepy.errors.TweepyException as e:
@@ -257,11 +475,11 @@ class BotStreamListener(tweepy.StreamingClient):
             except Exception as e:
                 print(f"An unexpected error occurred in on_tweet: {e}")
 
-    def on_error(self, status_code):
+    async def on_error(self, status_code):
         print(f"Stream error: {status_code}")
         return True # Don't kill the bot on a rate limit error
 
-    def on_connection_error(self):
+    async def on_connection_error(self):
         print("Stream connection error.")
 
 
@@ -269,12 +487,15 @@ class BotStreamListener(tweepy.StreamingClient):
 # 6. MAIN EXECUTION BLOCK
 # ==============================================================================
 
-if __name__ == "__main__":
+async def main():
     print("Starting RUGGUARD Bot...")
+    load_trusted_accounts_from_disk()
+    start_trusted_accounts_refresher()
 
+    client_v2 = None
     try:
         # Initialize API v2 Client (for actions like get_user and reply)
-        client_v2 = tweepy.Client(
+        client_v2 = AsyncClient(
             bearer_token=config.BEARER_TOKEN,
             consumer_key=config.API_KEY,
             consumer_secret=config.API_KEY_SECRET,
@@ -288,21 +509,29 @@ if __name__ == "__main__":
         stream_listener = BotStreamListener(bearer_token=config.BEARER_TOKEN, client_v2=client_v2)
 
         # Clear out old filter rules (best practice)
-        rules = stream_listener.get_rules().data
+        rules = (await stream_listener.get_rules()).data
         if rules:
-            stream_listener.delete_rules([rule.id for rule in rules])
+            await stream_listener.delete_rules([rule.id for rule in rules])
             print("Old filter rules have been deleted.")
 
         # Add new filter rule to monitor mentions of the bot
         rule_string = f"@{config.BOT_USERNAME} {config.TRIGGER_PHRASE}"
-        stream_listener.add_rules(tweepy.StreamRule(rule_string))
+        await stream_listener.add_rules(tweepy.StreamRule(rule_string))
         print(f"New filter rule added: '{rule_string}'")
 
         # Start listening to the stream
-        stream_listener.filter(expansions=["author_id"], tweet_fields=["referenced_tweets"])
+        await stream_listener.filter(expansions=["author_id"], tweet_fields=["referenced_tweets"])
 
     except tweepy.errors.TweepyException as e:
         print(f"Tweepy authentication or connection error: {e}")
         print("Please ensure your API keys are correct and have the necessary permissions.")
     except Exception as e:
         print(f"A fatal error occurred in main: {e}")
+    finally:
+        # AsyncClient opens its aiohttp session lazily and never closes it itself
+        if client_v2 is not None and client_v2.session is not None:
+            await client_v2.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())